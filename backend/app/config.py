@@ -4,6 +4,7 @@ Loads environment variables and provides settings singleton
 """
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 
 
 class Settings(BaseSettings):
@@ -13,9 +14,16 @@ class Settings(BaseSettings):
     supabase_url: str
     supabase_service_key: str
     supabase_jwt_secret: str  # From Supabase Dashboard > Settings > API > JWT Secret
+    # Optional direct Postgres DSN for hot-path queries via asyncpg
+    # (Supabase Dashboard > Settings > Database > Connection string).
+    # When unset, all queries go through the Supabase HTTP client.
+    database_url: Optional[str] = None
     
     # Gemini AI Configuration
     gemini_api_key: str
+    # Serve repeated identical prompts from cache (disable in development
+    # when iterating on prompt wording)
+    gemini_cache_enabled: bool = True
     
     # Application Settings
     environment: str = "development"
@@ -2,10 +2,14 @@
 Supabase Database Client
 Provides database connection for the application
 """
+from typing import Optional
+
+import asyncpg
 from supabase import create_client, Client
 from .config import get_settings
 
 _supabase_client: Client = None
+_pg_pool: Optional[asyncpg.Pool] = None
 
 
 def get_supabase() -> Client:
@@ -25,3 +29,37 @@ def get_supabase() -> Client:
 def get_storage_client():
     """Get Supabase storage client for file uploads"""
     return get_supabase().storage
+
+
+async def init_pg_pool() -> Optional[asyncpg.Pool]:
+    """Create the asyncpg pool for hot-path queries (app startup)
+
+    Returns None when no direct database_url is configured; callers
+    fall back to the Supabase HTTP client in that case.
+    """
+    global _pg_pool
+
+    settings = get_settings()
+    if settings.database_url and _pg_pool is None:
+        _pg_pool = await asyncpg.create_pool(
+            settings.database_url,
+            min_size=2,
+            max_size=10,
+            command_timeout=2
+        )
+
+    return _pg_pool
+
+
+def get_pg_pool() -> Optional[asyncpg.Pool]:
+    """Get the asyncpg pool, or None if not configured"""
+    return _pg_pool
+
+
+async def close_pg_pool() -> None:
+    """Close the asyncpg pool (app shutdown)"""
+    global _pg_pool
+
+    if _pg_pool is not None:
+        await _pg_pool.close()
+        _pg_pool = None
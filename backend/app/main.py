@@ -11,13 +11,24 @@ from slowapi.errors import RateLimitExceeded
 from contextlib import asynccontextmanager
 
 from .config import get_settings
+from .database import init_pg_pool, close_pg_pool
 from .routers import ecg, analysis, user, chat
+from .services.gemini_service import get_gemini_service
 
 
 # Rate limiter instance
 limiter = Limiter(key_func=get_remote_address)
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application lifespan - manage shared clients and pools"""
+    await init_pg_pool()
+    yield
+    await close_pg_pool()
+    await get_gemini_service().aclose()
+
+
 # Create FastAPI application
 app = FastAPI(
     title="PULSO ECG Analysis API",
@@ -38,6 +49,7 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 # Add rate limiter to app state
@@ -10,8 +10,8 @@ from datetime import datetime
 
 from ..utils.auth import get_current_user, CurrentUser
 from ..models.analysis import AnalysisResponse, AnalysisHistoryItem
-from ..services.gemini_service import GeminiService
-from ..services.supabase_service import SupabaseService
+from ..services.gemini_service import GeminiService, get_gemini_service
+from ..services.supabase_service import SupabaseService, get_supabase_service
 from ..config import get_settings
 
 router = APIRouter()
@@ -24,22 +24,21 @@ settings = get_settings()
 async def request_analysis(
     request: Request,
     reading_id: int,
-    user: CurrentUser = Depends(get_current_user)
+    user: CurrentUser = Depends(get_current_user),
+    supabase: SupabaseService = Depends(get_supabase_service),
+    gemini: GeminiService = Depends(get_gemini_service)
 ):
     """
     Request Gemini AI analysis for an ECG session
-    
+
     This endpoint:
     1. Fetches all relevant data (ECG, questionnaire, medical history, medications)
     2. Downloads the ECG snapshot image
     3. Sends everything to Gemini for analysis
     4. Stores and returns the results
-    
+
     Rate limited to 5 requests per hour per user.
     """
-    supabase = SupabaseService()
-    gemini = GeminiService()
-    
     # Gather all required data
     session = await supabase.get_complete_session(reading_id, user.id)
     if not session:
@@ -78,14 +77,14 @@ async def request_analysis(
 @router.get("/{reading_id}", response_model=AnalysisResponse)
 async def get_analysis(
     reading_id: int,
-    user: CurrentUser = Depends(get_current_user)
+    user: CurrentUser = Depends(get_current_user),
+    service: SupabaseService = Depends(get_supabase_service)
 ):
     """
     Get existing analysis results for an ECG session
-    
+
     Returns the stored AI analysis if available.
     """
-    service = SupabaseService()
     analysis = await service.get_analysis(reading_id, user.id)
     
     if not analysis:
@@ -100,13 +99,13 @@ async def get_analysis(
 @router.get("/history/list", response_model=List[AnalysisHistoryItem])
 async def get_analysis_history(
     limit: int = 10,
-    user: CurrentUser = Depends(get_current_user)
+    user: CurrentUser = Depends(get_current_user),
+    service: SupabaseService = Depends(get_supabase_service)
 ):
     """
     Get user's analysis history
-    
+
     Returns a list of past analyses with summary information.
     """
-    service = SupabaseService()
     history = await service.get_analysis_history(user.id, limit)
     return history
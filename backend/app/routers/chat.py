@@ -2,18 +2,74 @@
 Chat Router
 API endpoints for AI chat functionality
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import hashlib
+import json
+import re
+
+from cachetools import TTLCache
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 
 from ..utils.auth import get_current_user, CurrentUser
-from ..services.supabase_service import SupabaseService
-from ..services.gemini_service import GeminiService
+from ..services.supabase_service import SupabaseService, get_supabase_service
+from ..services.gemini_service import GeminiService, get_gemini_service
 
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
+# Cache for detected intents so repeated questions skip the keyword scan
+# and the session lookup. Keyed by (user_id, epoch, message hash); the
+# per-user epoch is bumped when a new session is recorded so stale
+# session ids are never served.
+_intent_cache = TTLCache(maxsize=2048, ttl=300)
+_intent_epochs: dict = {}
+
+# Keyword tables for intent detection, listed in priority order:
+# comparison > trend_analysis > session_query. The second value is how
+# many recent sessions that intent pulls into the context. Single words
+# are matched by set membership against the tokenized message; multi-word
+# phrases get one anchored regex per intent.
+_INTENT_KEYWORDS = (
+    ("comparison", 2,
+     frozenset({"compare", "compares", "compared", "comparison", "comparisons",
+                "versus", "vs", "difference", "differences"}),
+     ()),
+    ("trend_analysis", 7,
+     frozenset({"trend", "trends", "week", "weeks", "weekly",
+                "month", "months", "monthly", "history", "progress"}),
+     ("over time",)),
+    ("session_query", 1,
+     frozenset({"recent", "recently", "today", "yesterday",
+                "hrv", "ecg", "ecgs"}),
+     ("last session", "my session", "heart rate")),
+)
+_TOKEN_RE = re.compile(r"[a-z]+")
+# Phrases accept an optional trailing "s" ("last sessions", "heart rates")
+_PHRASE_RES = tuple(
+    re.compile(r"\b(?:" + "|".join(re.escape(p) + "s?" for p in phrases) + r")\b") if phrases else None
+    for _, _, _, phrases in _INTENT_KEYWORDS
+)
+
+# Per-session block of the chat context, interpolated once per session
+_SESSION_CONTEXT_TEMPLATE = """
+## {label} (ID: {sid})
+- Date: {date}
+- Duration: {duration} seconds
+- Average Heart Rate: {avg_hr:.1f} BPM
+- Max Heart Rate: {max_hr:.1f} BPM
+- Min Heart Rate: {min_hr:.1f} BPM
+- R-Peaks Detected: {r_peak_count}
+"""
+
+
+def bump_intent_epoch(user_id: str) -> None:
+    """Invalidate cached intents for a user (e.g. after a new session)"""
+    _intent_epochs[user_id] = _intent_epochs.get(user_id, 0) + 1
+
 
 class ChatMessage(BaseModel):
     """Request model for chat message"""
@@ -32,29 +88,29 @@ class ChatResponse(BaseModel):
 @router.post("/message", response_model=ChatResponse)
 async def send_chat_message(
     request: ChatMessage,
-    user: CurrentUser = Depends(get_current_user)
+    background_tasks: BackgroundTasks,
+    user: CurrentUser = Depends(get_current_user),
+    supabase: SupabaseService = Depends(get_supabase_service),
+    gemini: GeminiService = Depends(get_gemini_service)
 ):
     """
     Send a message to the AI assistant and get a response.
-    
+
     The AI can:
     - Answer questions about specific or recent sessions
     - Compare multiple sessions
     - Provide health recommendations
     - Explain ECG concepts in simple terms
     """
-    supabase = SupabaseService()
-    gemini = GeminiService()
-    
     # Detect intent from the message
     intent, session_ids = await _detect_intent(request.message, request.session_id, supabase, user.id)
-    
-    # Gather context based on intent
-    context = await _build_context(intent, session_ids, supabase, user.id)
-    
-    # Get user profile for personalization
-    user_profile = await supabase.get_user_profile(user.id)
-    
+
+    # Context and profile are independent fetches - run them concurrently
+    context, user_profile = await asyncio.gather(
+        _build_context(intent, session_ids, supabase, user.id),
+        supabase.get_user_profile(user.id)
+    )
+
     # Generate response from Gemini
     response = await gemini.chat_with_context(
         user_message=request.message,
@@ -62,16 +118,17 @@ async def send_chat_message(
         user_profile=user_profile,
         intent=intent
     )
-    
-    # Save chat to history
-    await supabase.save_chat_message(
+
+    # Save chat to history after the response is sent
+    background_tasks.add_task(
+        supabase.save_chat_message,
         user_id=user.id,
         user_message=request.message,
         ai_response=response,
         intent=intent,
         session_ids=session_ids
     )
-    
+
     return ChatResponse(
         response=response,
         intent=intent,
@@ -80,13 +137,58 @@ async def send_chat_message(
     )
 
 
+@router.post("/message/stream")
+async def send_chat_message_stream(
+    request: ChatMessage,
+    user: CurrentUser = Depends(get_current_user),
+    supabase: SupabaseService = Depends(get_supabase_service),
+    gemini: GeminiService = Depends(get_gemini_service)
+):
+    """
+    Send a message to the AI assistant and stream the response.
+
+    Same behavior as /message, but the answer is delivered as
+    server-sent events while Gemini generates it, so the client can
+    render text immediately instead of waiting for the full response.
+    """
+    intent, session_ids = await _detect_intent(request.message, request.session_id, supabase, user.id)
+
+    context, user_profile = await asyncio.gather(
+        _build_context(intent, session_ids, supabase, user.id),
+        supabase.get_user_profile(user.id)
+    )
+
+    async def event_stream():
+        chunks = []
+        async for delta in gemini.chat_with_context_stream(
+            user_message=request.message,
+            context=context,
+            user_profile=user_profile,
+            intent=intent
+        ):
+            chunks.append(delta)
+            yield f"data: {json.dumps({'text': delta})}\n\n"
+        yield f"data: {json.dumps({'done': True, 'intent': intent, 'session_ids': session_ids})}\n\n"
+
+        # Persist after the stream completes; client already has the data
+        await supabase.save_chat_message(
+            user_id=user.id,
+            user_message=request.message,
+            ai_response="".join(chunks),
+            intent=intent,
+            session_ids=session_ids
+        )
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 @router.get("/history")
 async def get_chat_history(
     limit: int = 20,
-    user: CurrentUser = Depends(get_current_user)
+    user: CurrentUser = Depends(get_current_user),
+    supabase: SupabaseService = Depends(get_supabase_service)
 ):
     """Get recent chat history for the user"""
-    supabase = SupabaseService()
     history = await supabase.get_chat_history(user.id, limit)
     return {"messages": history}
 
@@ -98,31 +200,41 @@ async def _detect_intent(message: str, session_id: Optional[str], supabase: Supa
     """
     message_lower = message.lower()
     session_ids = []
-    
-    # Check for specific session reference
+
+    # Check for specific session reference (per-call, never cached)
     if session_id:
         session_ids = [session_id]
         return ("session_specific", session_ids)
-    
-    # Check for comparison keywords
-    if any(word in message_lower for word in ["compare", "comparison", "versus", "vs", "difference"]):
-        # Get last 2 sessions for comparison
-        sessions = await supabase.get_recent_sessions_basic(user_id, limit=2)
-        session_ids = [s["id"] for s in sessions]
-        return ("comparison", session_ids)
-    
-    # Check for trend/history keywords
-    if any(word in message_lower for word in ["trend", "week", "month", "over time", "history", "progress"]):
-        sessions = await supabase.get_recent_sessions_basic(user_id, limit=7)
-        session_ids = [s["id"] for s in sessions]
-        return ("trend_analysis", session_ids)
-    
-    # Check for session-related keywords
-    if any(word in message_lower for word in ["last session", "recent", "my session", "today", "yesterday", "heart rate", "hrv", "ecg"]):
-        sessions = await supabase.get_recent_sessions_basic(user_id, limit=1)
-        session_ids = [s["id"] for s in sessions]
-        return ("session_query", session_ids)
-    
+
+    cache_key = (
+        user_id,
+        _intent_epochs.get(user_id, 0),
+        hashlib.blake2b(message_lower.encode(), digest_size=16).digest()
+    )
+    cached = _intent_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    result = await _detect_intent_uncached(message_lower, supabase, user_id)
+    intent, session_ids = result
+    # Don't memoize a session-backed intent whose session lookup came
+    # back empty - a transient Supabase failure would otherwise pin
+    # context-less answers for the whole TTL
+    if intent == "general_health" or session_ids:
+        _intent_cache[cache_key] = result
+    return result
+
+
+async def _detect_intent_uncached(message_lower: str, supabase: SupabaseService, user_id: str) -> tuple:
+    """Run the keyword scan and session lookup for _detect_intent"""
+    # Tokenize once; each keyword check is then an O(1) set lookup
+    tokens = frozenset(_TOKEN_RE.findall(message_lower))
+
+    for (intent, limit, words, _), phrase_re in zip(_INTENT_KEYWORDS, _PHRASE_RES):
+        if (tokens & words) or (phrase_re is not None and phrase_re.search(message_lower)):
+            sessions = await supabase.get_recent_sessions_basic(user_id, limit=limit)
+            return (intent, [s["id"] for s in sessions])
+
     # Default: general health question
     return ("general_health", [])
 
@@ -133,20 +245,25 @@ async def _build_context(intent: str, session_ids: List[str], supabase: Supabase
     if not session_ids:
         return ""
     
+    # One RPC returning just the summary columns rendered below
+    sessions = await supabase.get_session_summaries(
+        [int(sid) for sid in session_ids], user_id
+    )
+
     context_parts = []
-    
+
     for i, session_id in enumerate(session_ids):
-        session = await supabase.get_complete_session(int(session_id), user_id)
+        session = sessions.get(int(session_id))
         if session:
-            label = f"Session {i+1}" if len(session_ids) > 1 else "Latest Session"
-            context_parts.append(f"""
-## {label} (ID: {session_id})
-- Date: {session.get('created_at', 'Unknown')}
-- Duration: {session.get('duration_seconds', 0)} seconds
-- Average Heart Rate: {session.get('average_heart_rate', 0):.1f} BPM
-- Max Heart Rate: {session.get('max_heart_rate', 0):.1f} BPM
-- Min Heart Rate: {session.get('min_heart_rate', 0):.1f} BPM
-- R-Peaks Detected: {session.get('r_peak_count', 0)}
-""")
-    
+            context_parts.append(_SESSION_CONTEXT_TEMPLATE.format_map({
+                "label": f"Session {i+1}" if len(session_ids) > 1 else "Latest Session",
+                "sid": session_id,
+                "date": session.get('created_at', 'Unknown'),
+                "duration": session.get('duration_seconds', 0),
+                "avg_hr": session.get('average_heart_rate', 0),
+                "max_hr": session.get('max_heart_rate', 0),
+                "min_hr": session.get('min_heart_rate', 0),
+                "r_peak_count": session.get('r_peak_count', 0),
+            }))
+
     return "\n".join(context_parts)
@@ -11,6 +11,7 @@ from ..utils.auth import get_current_user, CurrentUser
 from ..models.ecg import QuestionnaireCreate, QuestionnaireResponse, ECGSessionResponse
 from ..services.supabase_service import SupabaseService
 from ..services.storage_service import StorageService
+from .chat import bump_intent_epoch
 
 router = APIRouter()
 limiter = Limiter(key_func=get_remote_address)
@@ -38,7 +39,10 @@ async def save_questionnaire(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Failed to save questionnaire"
         )
-    
+
+    # New session recorded - cached chat intents may reference stale sessions
+    bump_intent_epoch(user.id)
+
     return result
 
 
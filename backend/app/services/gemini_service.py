@@ -3,15 +3,171 @@ Gemini AI Service
 Integration with Google Gemini for ECG analysis
 Using direct REST API to avoid library compatibility issues
 """
+import asyncio
+import hashlib
 import httpx
 import json
+import orjson
 import base64
-import statistics
+import numpy as np
 from typing import Dict, List, Optional
+from functools import lru_cache
+
+from cachetools import TTLCache
 
 from ..config import get_settings
 
 
+# Response schema enforced via Gemini JSON mode so the analysis comes
+# back as raw JSON instead of prose-wrapped, fenced markdown
+_ANALYSIS_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "prediction": {"type": "STRING"},
+        "detailed_analysis": {
+            "type": "OBJECT",
+            "properties": {
+                "rhythm_assessment": {"type": "STRING"},
+                "rate_analysis": {"type": "STRING"},
+                "hrv_interpretation": {"type": "STRING"},
+                "clinical_significance": {"type": "STRING"},
+            },
+        },
+        "clinical_analysis": {"type": "STRING"},
+        "simple_explanation": {"type": "STRING"},
+        "risk_level": {
+            "type": "STRING",
+            "enum": ["low", "moderate", "high", "critical"],
+        },
+        "recommendations": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "summary": {"type": "STRING"},
+        "confidence": {"type": "NUMBER"},
+    },
+    "required": ["prediction", "risk_level", "recommendations", "summary"],
+}
+
+
+# Prompt templates are built once at import; per-request values are
+# interpolated with str.format_map so the static instruction text
+# (guidelines, disclaimer) is not re-assembled on every call
+_ANALYSIS_PROMPT_TEMPLATE = """You are a medical AI assistant specialized in ECG analysis.
+Analyze the following ECG data and provide insights at TWO levels: professional and layman.
+
+## Patient Profile
+- Age: {age}
+- Gender: {gender}
+- Existing Conditions: {conditions}
+- Current Medications: {med_names}
+
+## Session Context
+- Time of Day: {time_of_day}
+- Caffeine Consumed (last 2 hrs): {caffeine}
+- Nicotine Consumed: {nicotine}
+- Activity Level: {activity}
+- Stress Level: {stress}/5
+- Additional Symptoms: {symptoms}
+
+## ECG Session Metrics
+- Duration: {duration} seconds
+- Average Heart Rate: {avg_hr:.1f} BPM
+- Maximum Heart Rate: {max_hr:.1f} BPM
+- Minimum Heart Rate: {min_hr:.1f} BPM
+- R-Peak Count: {r_peak_count}
+- HRV (SDNN): {sdnn:.2f} ms
+- HRV (RMSSD): {rmssd:.2f} ms
+
+Please provide your analysis in this exact JSON format:
+{{
+  "prediction": "Brief headline describing the main finding (e.g., 'Elevated Heart Rate with Moderate HRV')",
+  "detailed_analysis": {{
+    "rhythm_assessment": "Describe the heart rhythm pattern observed. Is it regular or irregular? What does the R-peak pattern suggest?",
+    "rate_analysis": "Analyze the heart rate values. Is the average/max/min within normal range for the patient's profile? What might explain any deviations?",
+    "hrv_interpretation": "Interpret the HRV values (SDNN, RMSSD). What do they indicate about the autonomic nervous system and stress levels?",
+    "clinical_significance": "What is the overall clinical significance of these findings? Are there any patterns that warrant attention?"
+  }},
+  "clinical_analysis": "Comprehensive medical professional-level analysis summarizing all findings. Use proper medical terminology. Include rhythm, rate, HRV interpretation, and clinical implications. 6-8 sentences.",
+  "simple_explanation": "Explain the findings in plain, friendly language that anyone can understand. Use analogies and relate to daily life. Be reassuring where appropriate. Focus on what matters most for the patient. 5-7 sentences.",
+  "risk_level": "low|moderate|high|critical",
+  "recommendations": [
+    "Specific actionable recommendation 1",
+    "Specific actionable recommendation 2",
+    "Specific actionable recommendation 3",
+    "Lifestyle or follow-up recommendation 4"
+  ],
+  "summary": "One clear, concise sentence summarizing the most important takeaway from this analysis.",
+  "confidence": 0.85
+}}
+
+Guidelines:
+- "detailed_analysis" provides structured breakdown of each aspect
+- "clinical_analysis" is for healthcare providers - be precise and use medical terminology
+- "simple_explanation" is for regular users - avoid jargon, use everyday language
+- "summary" must be exactly ONE sentence - the key takeaway a patient should remember
+- Keep recommendations practical, specific, and actionable
+- Be thorough but not unnecessarily alarming
+- Consider the patient's profile (age, conditions, medications) in your analysis
+
+IMPORTANT DISCLAIMER: This analysis is for informational purposes only and does not constitute medical advice. Always consult a qualified healthcare professional for medical concerns."""
+
+
+_CHAT_PROFILE_TEMPLATE = """
+## Your Profile
+- Age: {age}
+- Gender: {gender}
+- Known Conditions: {conditions}
+- Current Medications: {med_names}
+"""
+
+
+_CHAT_PROMPT_TEMPLATE = """You are a friendly, knowledgeable cardiac health assistant for the PULSO ECG monitoring app.
+
+Your role is to:
+- Answer questions about ECG sessions and heart health
+- Explain medical concepts in simple, understandable terms
+- Provide helpful wellness recommendations
+- Compare sessions when asked
+- Be supportive and encouraging
+
+{profile_context}
+
+{context}
+
+## User's Question
+{user_message}
+
+## Response Guidelines
+- Be conversational and friendly, like a helpful health companion
+- Use simple language that anyone can understand
+- If discussing specific data, reference the numbers clearly
+- For comparisons, highlight key differences and what they might mean
+- Always remind that this is not medical advice for serious concerns
+- Keep responses concise but informative (2-4 paragraphs max)
+- Use emojis sparingly for friendliness 💚
+
+Respond naturally to the user's question:"""
+
+
+# Short-term HRV (SDNN/RMSSD) is conventionally computed over a 5-minute
+# window; ~300 beats covers that at typical resting heart rates. Capping
+# here also bounds the cost of the metric for very long recordings.
+_HRV_WINDOW_PEAKS = 300
+
+
+# Identical prompts (and image) produce equivalent Gemini output, so
+# responses are memoized by content hash. Chat answers age out quickly;
+# analyses of an unchanged session are stable for much longer.
+_chat_response_cache = TTLCache(maxsize=1024, ttl=600)
+_analysis_response_cache = TTLCache(maxsize=256, ttl=86400)
+
+
+def _response_cache_key(prompt: str, image_data: Optional[bytes] = None) -> bytes:
+    """Content-addressed cache key over the prompt and optional image"""
+    digest = hashlib.blake2b(prompt.encode(), digest_size=16)
+    if image_data:
+        digest.update(image_data)
+    return digest.digest()
+
+
 class GeminiService:
     """Service for Gemini AI ECG analysis"""
     
@@ -19,7 +175,18 @@ class GeminiService:
         self.settings = get_settings()
         self.api_key = self.settings.gemini_api_key
         self.api_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-3-flash-preview:generateContent"
-    
+        self.stream_api_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-3-flash-preview:streamGenerateContent"
+        # Shared client so TCP/TLS handshakes are amortized across calls
+        self._client = httpx.AsyncClient(
+            timeout=60.0,
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50)
+        )
+
+    async def aclose(self):
+        """Close the shared HTTP client (called on app shutdown)"""
+        await self._client.aclose()
+
     async def analyze_ecg(
         self,
         session: Dict,
@@ -45,9 +212,22 @@ class GeminiService:
         # Build the analysis prompt
         prompt = self._build_prompt(session, user_profile, r_peaks)
         
-        # Call Gemini API via REST
+        # Call Gemini API via REST, reusing a cached response when the
+        # same session data was analyzed recently
         try:
-            result = await self._call_gemini_api(prompt, image_data)
+            cache_key = _response_cache_key(prompt, image_data)
+            if self.settings.gemini_cache_enabled:
+                cached = _analysis_response_cache.get(cache_key)
+                if cached is not None:
+                    return self._parse_response(cached)
+
+            result = await self._call_gemini_api(
+                prompt, image_data, response_schema=_ANALYSIS_RESPONSE_SCHEMA
+            )
+            # Don't memoize empty output (e.g. safety-blocked responses) -
+            # that would pin the fallback result for the whole TTL
+            if self.settings.gemini_cache_enabled and result:
+                _analysis_response_cache[cache_key] = result
             return self._parse_response(result)
             
         except Exception as e:
@@ -59,7 +239,12 @@ class GeminiService:
                 "recommendations": ["Please try again later or consult a healthcare professional"]
             }
     
-    async def _call_gemini_api(self, prompt: str, image_data: Optional[bytes] = None) -> str:
+    async def _call_gemini_api(
+        self,
+        prompt: str,
+        image_data: Optional[bytes] = None,
+        response_schema: Optional[Dict] = None
+    ) -> str:
         """Call Gemini API directly via REST"""
         url = f"{self.api_url}?key={self.api_key}"
         
@@ -67,48 +252,60 @@ class GeminiService:
         parts = [{"text": prompt}]
         
         if image_data:
+            # Encode off the event loop - multi-MB snapshots would
+            # otherwise block other coroutines during encoding
+            b64_image = await asyncio.to_thread(
+                lambda: base64.b64encode(image_data).decode('ascii')
+            )
             parts.append({
                 "inline_data": {
                     "mime_type": "image/png",
-                    "data": base64.b64encode(image_data).decode('utf-8')
+                    "data": b64_image
                 }
             })
         
+        generation_config = {
+            "temperature": 0.4,
+            "maxOutputTokens": 2048,
+        }
+        if response_schema:
+            # JSON mode: Gemini returns raw JSON matching the schema
+            generation_config["responseMimeType"] = "application/json"
+            generation_config["responseSchema"] = response_schema
+
         body = {
             "contents": [{"parts": parts}],
-            "generationConfig": {
-                "temperature": 0.4,
-                "maxOutputTokens": 2048,
-            }
+            "generationConfig": generation_config
         }
-        
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                url,
-                json=body,
-                headers={"Content-Type": "application/json"}
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                # Extract text from response
-                candidates = data.get("candidates", [])
-                if candidates:
-                    content = candidates[0].get("content", {})
-                    parts = content.get("parts", [])
-                    if parts:
-                        return parts[0].get("text", "")
-                return ""
-            else:
-                raise Exception(f"Gemini API error: {response.status_code} - {response.text}")
+
+        # Serialize with orjson and send raw bytes - httpx's json= path
+        # would re-encode the multi-KB prompt (and base64 image) with
+        # the slower stdlib encoder
+        response = await self._client.post(
+            url,
+            content=orjson.dumps(body),
+            headers={"Content-Type": "application/json"}
+        )
+
+        if response.status_code == 200:
+            data = orjson.loads(response.content)
+            # Extract text from response
+            candidates = data.get("candidates", [])
+            if candidates:
+                content = candidates[0].get("content", {})
+                parts = content.get("parts", [])
+                if parts:
+                    return parts[0].get("text", "")
+            return ""
+        else:
+            raise Exception(f"Gemini API error: {response.status_code} - {response.text}")
     
     async def _download_image(self, url: str) -> Optional[bytes]:
         """Download image from URL"""
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.get(url)
-                if response.status_code == 200:
-                    return response.content
+            response = await self._client.get(url, timeout=30.0)
+            if response.status_code == 200:
+                return response.content
         except Exception as e:
             print(f"Error downloading image: {e}")
         return None
@@ -130,123 +327,73 @@ class GeminiService:
         medications = profile.medications if profile else []
         med_names = ", ".join([m.medication_name for m in medications]) if medications else "None reported"
         
-        prompt = f"""You are a medical AI assistant specialized in ECG analysis.
-Analyze the following ECG data and provide insights at TWO levels: professional and layman.
-
-## Patient Profile
-- Age: {medical.get('age_at_record', 'Unknown')}
-- Gender: {medical.get('gender', 'Unknown')}
-- Existing Conditions: {medical.get('existing_conditions', 'None reported')}
-- Current Medications: {med_names}
-
-## Session Context
-- Time of Day: {questionnaire.get('time_of_day', 'Unknown')}
-- Caffeine Consumed (last 2 hrs): {questionnaire.get('caffeine_consumed', 'Unknown')}
-- Nicotine Consumed: {questionnaire.get('nicotine_consumed', 'Unknown')}
-- Activity Level: {questionnaire.get('activity_level', 'Unknown')}
-- Stress Level: {questionnaire.get('stress_score', 'Unknown')}/5
-- Additional Symptoms: {questionnaire.get('additional_symptoms', 'None')}
-
-## ECG Session Metrics
-- Duration: {session.get('duration_seconds', 0) or 0} seconds
-- Average Heart Rate: {(session.get('average_heart_rate') or 0):.1f} BPM
-- Maximum Heart Rate: {(session.get('max_heart_rate') or 0):.1f} BPM
-- Minimum Heart Rate: {(session.get('min_heart_rate') or 0):.1f} BPM
-- R-Peak Count: {session.get('r_peak_count', 0) or 0}
-- HRV (SDNN): {(hrv.get('sdnn') or 0):.2f} ms
-- HRV (RMSSD): {(hrv.get('rmssd') or 0):.2f} ms
-
-Please provide your analysis in this exact JSON format:
-{{
-  "prediction": "Brief headline describing the main finding (e.g., 'Elevated Heart Rate with Moderate HRV')",
-  "detailed_analysis": {{
-    "rhythm_assessment": "Describe the heart rhythm pattern observed. Is it regular or irregular? What does the R-peak pattern suggest?",
-    "rate_analysis": "Analyze the heart rate values. Is the average/max/min within normal range for the patient's profile? What might explain any deviations?",
-    "hrv_interpretation": "Interpret the HRV values (SDNN, RMSSD). What do they indicate about the autonomic nervous system and stress levels?",
-    "clinical_significance": "What is the overall clinical significance of these findings? Are there any patterns that warrant attention?"
-  }},
-  "clinical_analysis": "Comprehensive medical professional-level analysis summarizing all findings. Use proper medical terminology. Include rhythm, rate, HRV interpretation, and clinical implications. 6-8 sentences.",
-  "simple_explanation": "Explain the findings in plain, friendly language that anyone can understand. Use analogies and relate to daily life. Be reassuring where appropriate. Focus on what matters most for the patient. 5-7 sentences.",
-  "risk_level": "low|moderate|high|critical",
-  "recommendations": [
-    "Specific actionable recommendation 1",
-    "Specific actionable recommendation 2", 
-    "Specific actionable recommendation 3",
-    "Lifestyle or follow-up recommendation 4"
-  ],
-  "summary": "One clear, concise sentence summarizing the most important takeaway from this analysis.",
-  "confidence": 0.85
-}}
-
-Guidelines:
-- "detailed_analysis" provides structured breakdown of each aspect
-- "clinical_analysis" is for healthcare providers - be precise and use medical terminology
-- "simple_explanation" is for regular users - avoid jargon, use everyday language
-- "summary" must be exactly ONE sentence - the key takeaway a patient should remember
-- Keep recommendations practical, specific, and actionable
-- Be thorough but not unnecessarily alarming
-- Consider the patient's profile (age, conditions, medications) in your analysis
-
-IMPORTANT DISCLAIMER: This analysis is for informational purposes only and does not constitute medical advice. Always consult a qualified healthcare professional for medical concerns."""
+        fields = {
+            "age": medical.get('age_at_record', 'Unknown'),
+            "gender": medical.get('gender', 'Unknown'),
+            "conditions": medical.get('existing_conditions', 'None reported'),
+            "med_names": med_names,
+            "time_of_day": questionnaire.get('time_of_day', 'Unknown'),
+            "caffeine": questionnaire.get('caffeine_consumed', 'Unknown'),
+            "nicotine": questionnaire.get('nicotine_consumed', 'Unknown'),
+            "activity": questionnaire.get('activity_level', 'Unknown'),
+            "stress": questionnaire.get('stress_score', 'Unknown'),
+            "symptoms": questionnaire.get('additional_symptoms', 'None'),
+            "duration": session.get('duration_seconds', 0) or 0,
+            "avg_hr": session.get('average_heart_rate') or 0,
+            "max_hr": session.get('max_heart_rate') or 0,
+            "min_hr": session.get('min_heart_rate') or 0,
+            "r_peak_count": session.get('r_peak_count', 0) or 0,
+            "sdnn": hrv.get('sdnn') or 0,
+            "rmssd": hrv.get('rmssd') or 0,
+        }
 
-        return prompt
+        return _ANALYSIS_PROMPT_TEMPLATE.format_map(fields)
     
     def _calculate_hrv(self, r_peaks: List[Dict]) -> Dict[str, float]:
         """Calculate Heart Rate Variability metrics from R-peaks"""
         if len(r_peaks) < 2:
             return {"sdnn": 0.0, "rmssd": 0.0}
         
-        # Extract RR intervals
+        # Extract RR intervals, keeping only the trailing 5-minute window
         rr_intervals = [
-            p.get("rr_interval", 0) 
-            for p in r_peaks 
+            p["rr_interval"]
+            for p in r_peaks
             if p.get("rr_interval") and p.get("rr_interval") > 0
         ]
-        
-        if len(rr_intervals) < 2:
+        rr = np.array(rr_intervals[-_HRV_WINDOW_PEAKS:], dtype=np.float64)
+
+        if rr.size < 2:
             return {"sdnn": 0.0, "rmssd": 0.0}
-        
+
         try:
             # SDNN: Standard deviation of NN intervals
-            sdnn = statistics.stdev(rr_intervals)
-            
+            # ddof=1 matches statistics.stdev (Bessel's correction)
+            sdnn = float(rr.std(ddof=1))
+
             # RMSSD: Root mean square of successive differences
-            successive_diffs = [
-                abs(rr_intervals[i+1] - rr_intervals[i]) 
-                for i in range(len(rr_intervals) - 1)
-            ]
-            if successive_diffs:
-                rmssd = (sum(d**2 for d in successive_diffs) / len(successive_diffs)) ** 0.5
-            else:
-                rmssd = 0.0
-            
+            diffs = np.diff(rr)
+            rmssd = float(np.sqrt(np.mean(diffs * diffs)))
+
             return {"sdnn": sdnn, "rmssd": rmssd}
-            
+
         except Exception:
             return {"sdnn": 0.0, "rmssd": 0.0}
     
     def _parse_response(self, text: str) -> Dict:
         """Parse Gemini response into structured data"""
         try:
-            # Strip markdown code fences if present
-            clean_text = text.strip()
-            if clean_text.startswith("```"):
-                # Remove opening fence (```json or ```)
-                first_newline = clean_text.find('\n')
-                if first_newline > 0:
-                    clean_text = clean_text[first_newline + 1:]
-                # Remove closing fence
-                if clean_text.endswith("```"):
-                    clean_text = clean_text[:-3].strip()
-            
-            # Find JSON in response
-            start = clean_text.find('{')
-            end = clean_text.rfind('}') + 1
-            
-            if start >= 0 and end > start:
-                json_str = clean_text[start:end]
-                data = json.loads(json_str)
-                
+            # JSON mode guarantees raw JSON output - parse directly
+            try:
+                data = orjson.loads(text)
+            except orjson.JSONDecodeError:
+                # Fallback: locate a JSON object inside surrounding prose
+                start = text.find('{')
+                end = text.rfind('}') + 1
+                if start < 0 or end <= start:
+                    raise
+                data = orjson.loads(text[start:end])
+
+            if isinstance(data, dict):
                 # Extract detailed analysis if present
                 detailed = data.get("detailed_analysis", {})
                 detailed_text = ""
@@ -271,7 +418,7 @@ IMPORTANT DISCLAIMER: This analysis is for informational purposes only and does
                     "detailed_analysis": detailed_text,
                     "summary": data.get("summary", "")
                 }
-        except (json.JSONDecodeError, ValueError) as e:
+        except (orjson.JSONDecodeError, ValueError) as e:
             print(f"Error parsing Gemini response: {e}")
             print(f"Raw response: {text[:500]}")
         
@@ -303,57 +450,111 @@ IMPORTANT DISCLAIMER: This analysis is for informational purposes only and does
             user_profile: User profile for personalization
             intent: Detected intent type
         """
-        # Build profile context
-        profile_context = ""
-        if user_profile:
-            medical = user_profile.medical_history.__dict__ if user_profile.medical_history else {}
-            medications = user_profile.medications or []
-            med_names = ", ".join([m.medication_name for m in medications]) if medications else "None"
-            
-            profile_context = f"""
-## Your Profile
-- Age: {medical.get('age_at_record', 'Not specified')}
-- Gender: {medical.get('gender', 'Not specified')}
-- Known Conditions: {medical.get('existing_conditions', 'None reported')}
-- Current Medications: {med_names}
-"""
-        
-        # Build the chat prompt
-        prompt = f"""You are a friendly, knowledgeable cardiac health assistant for the PULSO ECG monitoring app.
-
-Your role is to:
-- Answer questions about ECG sessions and heart health
-- Explain medical concepts in simple, understandable terms
-- Provide helpful wellness recommendations
-- Compare sessions when asked
-- Be supportive and encouraging
-
-{profile_context}
-
-{context if context else ""}
-
-## User's Question
-{user_message}
-
-## Response Guidelines
-- Be conversational and friendly, like a helpful health companion
-- Use simple language that anyone can understand
-- If discussing specific data, reference the numbers clearly
-- For comparisons, highlight key differences and what they might mean
-- Always remind that this is not medical advice for serious concerns
-- Keep responses concise but informative (2-4 paragraphs max)
-- Use emojis sparingly for friendliness 💚
-
-Respond naturally to the user's question:"""
+        prompt = self._build_chat_prompt(user_message, context, user_profile)
 
         try:
+            cache_key = _response_cache_key(prompt)
+            if self.settings.gemini_cache_enabled:
+                cached = _chat_response_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+
             response = await self._call_gemini_api(prompt)
             # Clean up the response - remove any JSON formatting if present
             if response.startswith('{'):
                 # Try to extract text if it's accidentally JSON
                 return "I'm here to help! Could you please rephrase your question?"
-            return response.strip()
+            response = response.strip()
+            if self.settings.gemini_cache_enabled and response:
+                _chat_response_cache[cache_key] = response
+            return response
         except Exception as e:
             print(f"Chat error: {e}")
             return "I'm having trouble connecting right now. Please try again in a moment! 🔄"
 
+    async def chat_with_context_stream(
+        self,
+        user_message: str,
+        context: str,
+        user_profile,
+        intent: str
+    ):
+        """
+        Stream a conversational response chunk by chunk.
+
+        Yields text deltas as Gemini generates them, so the client sees
+        the first words without waiting for the full generation.
+        """
+        prompt = self._build_chat_prompt(user_message, context, user_profile)
+
+        try:
+            async for delta in self._stream_gemini_api(prompt):
+                yield delta
+        except Exception as e:
+            print(f"Chat stream error: {e}")
+            yield "I'm having trouble connecting right now. Please try again in a moment! 🔄"
+
+    async def _stream_gemini_api(self, prompt: str):
+        """Call the Gemini SSE streaming endpoint and yield text deltas"""
+        url = f"{self.stream_api_url}?alt=sse&key={self.api_key}"
+
+        body = {
+            "contents": [{"parts": [{"text": prompt}]}],
+            "generationConfig": {
+                "temperature": 0.4,
+                "maxOutputTokens": 2048,
+            }
+        }
+
+        async with self._client.stream(
+            "POST",
+            url,
+            content=orjson.dumps(body),
+            headers={"Content-Type": "application/json"}
+        ) as response:
+            if response.status_code != 200:
+                detail = (await response.aread()).decode("utf-8", errors="replace")
+                raise Exception(f"Gemini API error: {response.status_code} - {detail}")
+
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                try:
+                    data = json.loads(line[len("data: "):])
+                except json.JSONDecodeError:
+                    continue
+                candidates = data.get("candidates", [])
+                if candidates:
+                    parts = candidates[0].get("content", {}).get("parts", [])
+                    if parts:
+                        text = parts[0].get("text", "")
+                        if text:
+                            yield text
+
+    def _build_chat_prompt(self, user_message: str, context: str, user_profile) -> str:
+        """Build the conversational prompt shared by chat and chat-stream"""
+        # Build profile context
+        profile_context = ""
+        if user_profile:
+            medical = user_profile.medical_history.__dict__ if user_profile.medical_history else {}
+            medications = user_profile.medications or []
+            med_names = ", ".join([m.medication_name for m in medications]) if medications else "None"
+
+            profile_context = _CHAT_PROFILE_TEMPLATE.format_map({
+                "age": medical.get('age_at_record', 'Not specified'),
+                "gender": medical.get('gender', 'Not specified'),
+                "conditions": medical.get('existing_conditions', 'None reported'),
+                "med_names": med_names,
+            })
+
+        return _CHAT_PROMPT_TEMPLATE.format_map({
+            "profile_context": profile_context,
+            "context": context if context else "",
+            "user_message": user_message,
+        })
+
+
+@lru_cache()
+def get_gemini_service() -> GeminiService:
+    """Get cached GeminiService instance for dependency injection"""
+    return GeminiService()
@@ -4,19 +4,39 @@ Database operations for ECG sessions, users, and analysis
 """
 from typing import Optional, List, Dict, Any
 from datetime import datetime
+from functools import lru_cache
 
-from ..database import get_supabase
+from cachetools import TTLCache
+
+from ..database import get_supabase, get_pg_pool
 from ..models.ecg import QuestionnaireCreate, QuestionnaireResponse, ECGSessionResponse
 from ..models.user import UserProfile, MedicalHistory, Medication, MedicationCreate
 from ..models.analysis import AnalysisResponse, AnalysisHistoryItem
 
 
+# Profiles are near-static; cache them briefly so every chat message
+# doesn't re-fetch three tables. Invalidated on medication changes.
+_profile_cache = TTLCache(maxsize=10_000, ttl=60)
+
+# Explicit column lists matching the pydantic models, so queries don't
+# pull columns the API never uses
+_USER_COLUMNS = "user_id, name, age"
+_MEDICAL_HISTORY_COLUMNS = (
+    "age_at_record, gender, existing_conditions, "
+    "current_medications, last_checkup_date"
+)
+_MEDICATION_COLUMNS = (
+    "medication_id, medication_name, dosage, frequency, "
+    "start_date, end_date, notes, is_active, created_at"
+)
+
+
 class SupabaseService:
     """Service for Supabase database operations"""
-    
+
     def __init__(self):
         self.client = get_supabase()
-    
+
     # ==================== Questionnaire Operations ====================
     
     async def save_questionnaire(
@@ -100,6 +120,30 @@ class SupabaseService:
             print(f"Error getting session: {e}")
             return None
     
+    async def get_session_summaries(
+        self,
+        reading_ids: List[int],
+        user_id: str
+    ) -> Dict[int, Dict]:
+        """Get summary rows for a set of sessions in one RPC call
+
+        Uses the get_session_summaries Postgres function, which returns
+        only the columns the chat context renders (date, duration,
+        heart-rate stats, R-peak count). Returns a dict keyed by
+        reading_id; missing sessions are simply absent from the result.
+        """
+        if not reading_ids:
+            return {}
+        try:
+            result = self.client.rpc(
+                "get_session_summaries",
+                {"p_user": user_id, "p_ids": reading_ids}
+            ).execute()
+            return {row["reading_id"]: row for row in (result.data or [])}
+        except Exception as e:
+            print(f"Error getting session summaries: {e}")
+            return {}
+
     async def get_user_sessions(
         self, 
         user_id: str, 
@@ -134,24 +178,28 @@ class SupabaseService:
     
     async def get_user_profile(self, user_id: str) -> Optional[UserProfile]:
         """Get complete user profile with medical history and medications"""
+        cached = _profile_cache.get(user_id)
+        if cached is not None:
+            return cached
+
         try:
             # Get user
             user_result = self.client.table("users") \
-                .select("*") \
+                .select(_USER_COLUMNS) \
                 .eq("user_id", user_id) \
                 .single() \
                 .execute()
-            
+
             if not user_result.data:
                 return None
-            
+
             user = user_result.data
-            
+
             # Get medical history
             med_history = None
             try:
                 med_result = self.client.table("medical_history") \
-                    .select("*") \
+                    .select(_MEDICAL_HISTORY_COLUMNS) \
                     .eq("user_id", user_id) \
                     .single() \
                     .execute()
@@ -159,20 +207,26 @@ class SupabaseService:
                     med_history = MedicalHistory(**med_result.data)
             except:
                 pass
-            
+
             # Get medications
             medications = await self.get_medications(user_id, active_only=True)
-            
-            return UserProfile(
+
+            profile = UserProfile(
                 user_id=user["user_id"],
                 name=user.get("name"),
                 age=user.get("age"),
                 medical_history=med_history,
                 medications=medications
             )
+            _profile_cache[user_id] = profile
+            return profile
         except Exception as e:
             print(f"Error getting user profile: {e}")
             return None
+
+    def invalidate_profile_cache(self, user_id: str) -> None:
+        """Drop a user's cached profile after a profile-affecting write"""
+        _profile_cache.pop(user_id, None)
     
     async def get_medications(
         self, 
@@ -182,7 +236,7 @@ class SupabaseService:
         """Get user's medications"""
         try:
             query = self.client.table("medications") \
-                .select("*") \
+                .select(_MEDICATION_COLUMNS) \
                 .eq("user_id", user_id)
             
             if active_only:
@@ -210,8 +264,9 @@ class SupabaseService:
                 "notes": data.notes,
                 "is_active": True,
             }).execute()
-            
+
             if result.data:
+                self.invalidate_profile_cache(user_id)
                 return Medication(**result.data[0])
             return None
         except Exception as e:
@@ -230,6 +285,8 @@ class SupabaseService:
                 .eq("medication_id", medication_id) \
                 .eq("user_id", user_id) \
                 .execute()
+            if result.data:
+                self.invalidate_profile_cache(user_id)
             return bool(result.data)
         except:
             return False
@@ -364,6 +421,31 @@ class SupabaseService:
     
     async def get_chat_history(self, user_id: str, limit: int = 20) -> list:
         """Get recent chat history for user"""
+        pool = get_pg_pool()
+        if pool is not None:
+            try:
+                async with pool.acquire() as con:
+                    rows = await con.fetch(
+                        "SELECT user_id, user_message, ai_response, intent, "
+                        "session_ids, created_at "
+                        "FROM chat_history WHERE user_id = $1 "
+                        "ORDER BY created_at DESC LIMIT $2",
+                        user_id, limit
+                    )
+                import json
+                history = []
+                for row in rows:
+                    item = dict(row)
+                    # asyncpg returns jsonb as an undecoded string; match
+                    # the decoded shape the HTTP client produces
+                    if isinstance(item.get("session_ids"), str):
+                        item["session_ids"] = json.loads(item["session_ids"])
+                    history.append(item)
+                return history
+            except Exception as e:
+                # Fall back to the Supabase HTTP client below
+                print(f"Error getting chat history (pg), falling back: {e}")
+
         try:
             result = self.client.table("chat_history") \
                 .select("*") \
@@ -376,7 +458,27 @@ class SupabaseService:
             return []
     
     async def get_recent_sessions_basic(self, user_id: str, limit: int = 5) -> list:
-        """Get basic info about recent sessions (for chat context)"""
+        """Get basic info about recent sessions (for chat context)
+
+        Uses the asyncpg pool when configured - this runs on every chat
+        message with a session intent, and direct Postgres avoids the
+        Supabase HTTP layer's threadpool round-trip.
+        """
+        pool = get_pg_pool()
+        if pool is not None:
+            try:
+                async with pool.acquire() as con:
+                    rows = await con.fetch(
+                        "SELECT id, created_at, average_heart_rate, duration_seconds "
+                        "FROM ecg_readings WHERE user_id = $1 "
+                        "ORDER BY created_at DESC LIMIT $2",
+                        user_id, limit
+                    )
+                return [dict(row) for row in rows]
+            except Exception as e:
+                # Fall back to the Supabase HTTP client below
+                print(f"Error getting recent sessions (pg), falling back: {e}")
+
         try:
             result = self.client.table("ecg_readings") \
                 .select("id, created_at, average_heart_rate, duration_seconds") \
@@ -388,3 +490,8 @@ class SupabaseService:
         except:
             return []
 
+
+@lru_cache()
+def get_supabase_service() -> SupabaseService:
+    """Get cached SupabaseService instance for dependency injection"""
+    return SupabaseService()
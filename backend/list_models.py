@@ -1,41 +1,69 @@
 """
 Script to list available Gemini models
+
+Caches the (near-static) model list in models.json next to this file
+for a day, so repeat runs don't pay the network round-trip. Safe to
+import: nothing runs without __main__.
 """
 import os
+import sys
+import time
+import json
+from pathlib import Path
+
 import httpx
 from dotenv import load_dotenv
 
-load_dotenv()
+CACHE_FILE = Path(__file__).parent / "models.json"
+CACHE_MAX_AGE_SECONDS = 24 * 60 * 60
+
+
+def fetch_models(api_key: str) -> list:
+    """Fetch the model list, using the on-disk cache when fresh"""
+    if CACHE_FILE.exists() and time.time() - CACHE_FILE.stat().st_mtime < CACHE_MAX_AGE_SECONDS:
+        print(f"Using cached model list from {CACHE_FILE.name}")
+        return json.loads(CACHE_FILE.read_text())
+
+    url = f"https://generativelanguage.googleapis.com/v1beta/models?key={api_key}"
+
+    print("Fetching available Gemini models...")
+    response = httpx.get(url, timeout=30.0)
 
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    print("ERROR: GEMINI_API_KEY not found in .env")
-    exit(1)
+    if response.status_code != 200:
+        print(f"Error: {response.status_code}")
+        print(response.text)
+        sys.exit(1)
 
-url = f"https://generativelanguage.googleapis.com/v1beta/models?key={api_key}"
+    models = response.json().get("models", [])
+    CACHE_FILE.write_text(json.dumps(models, indent=2))
+    return models
 
-print("Fetching available Gemini models...")
-print("=" * 60)
 
-response = httpx.get(url, timeout=30.0)
+def main():
+    load_dotenv()
 
-if response.status_code == 200:
-    data = response.json()
-    models = data.get("models", [])
-    
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        print("ERROR: GEMINI_API_KEY not found in .env")
+        sys.exit(1)
+
+    models = fetch_models(api_key)
+
+    print("=" * 60)
     print(f"Found {len(models)} models:\n")
-    
+
     for model in models:
         name = model.get("name", "Unknown")
         display_name = model.get("displayName", "")
         methods = model.get("supportedGenerationMethods", [])
-        
+
         # Only show models that support generateContent
         if "generateContent" in methods:
             print(f"✅ {name}")
             print(f"   Display: {display_name}")
             print(f"   Methods: {', '.join(methods)}")
             print()
-else:
-    print(f"Error: {response.status_code}")
-    print(response.text)
+
+
+if __name__ == "__main__":
+    main()
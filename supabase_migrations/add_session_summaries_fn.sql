@@ -0,0 +1,32 @@
+-- ============================================================================
+-- Session Summaries Function - Incremental Update
+-- ============================================================================
+-- The chat assistant's context only needs per-session summary columns
+-- (date, duration, heart-rate stats, R-peak count), not complete readings
+-- with questionnaires. This function returns just those columns for a set
+-- of sessions in a single call.
+
+CREATE OR REPLACE FUNCTION public.get_session_summaries(p_user UUID, p_ids BIGINT[])
+RETURNS TABLE (
+    reading_id BIGINT,
+    created_at TIMESTAMP WITH TIME ZONE,
+    duration_seconds INTEGER,
+    average_heart_rate REAL,
+    max_heart_rate REAL,
+    min_heart_rate REAL,
+    r_peak_count INTEGER
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT
+        r.reading_id,
+        r.created_at,
+        r.duration_seconds,
+        r.average_heart_rate,
+        r.max_heart_rate,
+        r.min_heart_rate,
+        r.r_peak_count
+    FROM public.ecg_readings r
+    WHERE r.user_id = p_user
+      AND r.reading_id = ANY(p_ids);
+$$;